@@ -5,9 +5,13 @@ from __future__ import unicode_literals
 
 import datetime
 import os
+import re
 import sys
+import threading
 import uuid
-from shutil import copyfile
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+from shutil import Error, copyfile, copyfileobj
 
 import click
 import six
@@ -15,13 +19,35 @@ import six
 import lxml.etree
 import mets
 import xml_helpers.utils as xml_utils
-from scandir import scandir
+from scandir import scandir, walk
 from siptools.utils import get_objectlist
 from siptools.xml.mets import (METS_CATALOG, METS_PROFILE, METS_SPECIFICATION,
                                NAMESPACES, RECORD_STATUS_TYPES, mets_extend)
 
 click.disable_unicode_literals_warning = True
 
+METS_PART_SUFFIXES = ('-amd.xml', 'dmdsec.xml', 'structmap.xml',
+                      'filesec.xml', 'rightsmd.xml')
+
+WORK_FILE_SUFFIXES = METS_PART_SUFFIXES + ('md-references.xml',
+                                          '-scraper.pkl')
+
+# File properties are written only to the top level of the workspace, named
+# after the MD5 digest of the technical metadata. Copied digital objects may
+# have similar names in subdirectories, so the pattern is not a suffix.
+PROPERTIES_FILE_RE = re.compile(r'^[0-9a-f]{32}-properties\.json$')
+
+COPY_BUFFER_SIZE = 8 * 1024 * 1024
+
+AMDSEC_TAG = '{%s}amdSec' % NAMESPACES['mets']
+
+METS_PART_TAGS = tuple('{%s}%s' % (NAMESPACES['mets'], tag) for tag in
+                       ('dmdSec', 'amdSec', 'fileSec', 'structMap'))
+
+# XML parsers can not be shared between threads, so each thread reading
+# partial METS documents creates its own parser
+_THREAD_DATA = threading.local()
+
 
 @click.command()
 @click.argument('mets_profile', type=click.Choice(METS_PROFILE))
@@ -38,9 +64,9 @@ click.disable_unicode_literals_warning = True
               default='.',
               help='Base path of the digital objects.')
 @click.option('--objid', type=str,
-              default=six.text_type(uuid.uuid4()),
               metavar='<OBJID>',
-              help='Unique identifier for the package')
+              help='Unique identifier for the package. Defaults to a new '
+                   'UUID.')
 @click.option('--label',
               type=str,
               metavar='<LABEL>',
@@ -52,7 +78,6 @@ click.disable_unicode_literals_warning = True
                    'content is divided in several SIPs.')
 @click.option('--create_date',
               type=str,
-              default=datetime.datetime.utcnow().isoformat(),
               metavar='<CREATION DATE>',
               help='SIP create datetime formatted as '
                    'yyyy-mm-ddThh:mm:ss. Defaults to current time.')
@@ -129,15 +154,17 @@ def compile_mets(mets_profile, organization_name, contractid, objid=None,
     )
 
     if stdout:
-        print(xml_utils.serialize(mets_document.getroot()))
+        print(xml_utils.serialize(mets_document).decode("utf-8"))
 
     output_file = os.path.join(workspace, 'mets.xml')
 
     if not os.path.exists(os.path.dirname(output_file)):
         os.makedirs(os.path.dirname(output_file))
 
-    with open(output_file, 'wb+') as outfile:
-        outfile.write(xml_utils.serialize(mets_document.getroot()))
+    mets_document.write(output_file,
+                        pretty_print=True,
+                        xml_declaration=True,
+                        encoding='UTF-8')
 
     print("compile_mets created file: %s" % output_file)
 
@@ -188,15 +215,11 @@ def create_mets(workspace, mets_attributes, metshdr_attributes,
                            agents)
 
     # Collect elements from workspace XML files
-    elements = []
-    for entry in scandir(workspace):
-        if entry.name.endswith(('-amd.xml', 'dmdsec.xml',
-                                'structmap.xml', 'filesec.xml',
-                                'rightsmd.xml')) and entry.is_file():
-            element = lxml.etree.parse(entry.path).getroot()[0]
-            elements.append(element)
-
-    elements = mets.merge_elements('{%s}amdSec' % NAMESPACES['mets'], elements)
+    paths = [entry.path for entry in scandir(workspace)
+             if entry.name.endswith(METS_PART_SUFFIXES) and entry.is_file()]
+    elements = read_mets_parts(paths)
+
+    elements = mets.merge_elements(AMDSEC_TAG, elements)
     elements.sort(key=mets.order)
 
     # Create METS element
@@ -217,27 +240,94 @@ def create_mets(workspace, mets_attributes, metshdr_attributes,
     return lxml.etree.ElementTree(mets_element)
 
 
+def read_mets_parts(paths):
+    """Read the METS sections from partial METS documents. If there are
+    several documents and processors, the documents are parsed in a pool
+    of threads. libxml2 releases the GIL while it parses a file, so the
+    threads parse in parallel.
+
+    :param paths: list of paths to partial METS documents
+    :returns: list of METS section elements in the order of paths
+    """
+    processes = min(len(paths), cpu_count())
+    if processes < 2:
+        return [read_mets_part(path) for path in paths]
+
+    pool = ThreadPool(processes)
+    try:
+        return pool.map(read_mets_part, paths)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def read_mets_part(path):
+    """Read the METS section from a partial METS document.
+
+    :param path: path to partial METS document
+    :returns: the first dmdSec, amdSec, fileSec or structMap element under
+              the root element
+    """
+    parser = getattr(_THREAD_DATA, 'parser', None)
+    if parser is None:
+        parser = lxml.etree.XMLParser(remove_blank_text=True)
+        _THREAD_DATA.parser = parser
+
+    root = lxml.etree.parse(path, parser).getroot()
+    for element in root.iterchildren(*METS_PART_TAGS):
+        return element
+
+    raise ValueError('No METS section found in file %s' % path)
+
+
 def clean_metsparts(path):
     """Clean mets parts from workspace
     """
-    for root, _, files in os.walk(path, topdown=False):
+    for root, _, files in walk(path, topdown=False):
         for name in files:
-            if (name.endswith(('-amd.xml', 'dmdsec.xml', 'structmap.xml',
-                               'filesec.xml', 'rightsmd.xml',
-                               'md-references.xml',
-                               '-scraper.pkl'))):
+            if name.endswith(WORK_FILE_SUFFIXES):
                 os.remove(os.path.join(root, name))
 
+    for name in os.listdir(path):
+        if PROPERTIES_FILE_RE.match(name):
+            os.remove(os.path.join(path, name))
+
 
 def copy_objects(workspace, data_dir):
     """Copy digital objects to workspace
     """
     files = get_objectlist(workspace)
+    target_dirs = set()
     for source in files:
         target = os.path.join(workspace, source)
-        if not os.path.exists(os.path.dirname(target)):
-            os.makedirs(os.path.dirname(target))
-        copyfile(os.path.join(data_dir, source), target)
+        target_dir = os.path.dirname(target)
+        if target_dir not in target_dirs:
+            if not os.path.exists(target_dir):
+                os.makedirs(target_dir)
+            target_dirs.add(target_dir)
+        copy_file(os.path.join(data_dir, source), target)
+
+
+def copy_file(source, target):
+    """Copy contents of source file to target file. If os.sendfile() is
+    available, shutil.copyfile() is used, which copies the data in the
+    kernel on Python 3.8 and later. Elsewhere the data is copied with large
+    buffered reads and writes.
+
+    :param source: path of the file to copy
+    :param target: path of the new file
+    :raises shutil.Error: if source and target are the same file
+    :returns: ``None``
+    """
+    if hasattr(os, 'sendfile'):
+        copyfile(source, target)
+        return
+
+    if os.path.exists(target) and os.path.samefile(source, target):
+        raise Error('%s and %s are the same file' % (source, target))
+
+    with open(source, 'rb') as infile, open(target, 'wb') as outfile:
+        copyfileobj(infile, outfile, COPY_BUFFER_SIZE)
 
 
 if __name__ == '__main__':
@@ -2,17 +2,20 @@
 metadata for a METS document."""
 from __future__ import unicode_literals
 
+import json
 import os
 import pickle
 import sys
+from collections import defaultdict
 from uuid import uuid4
 
 import click
+import six
 
 import lxml.etree as ET
 import mets
 import xml_helpers.utils as xml_utils
-from siptools.utils import add, encode_path, get_objectlist, tree
+from siptools.utils import decode_path, encode_path, get_objectlist, tree
 from siptools.xml.mets import NAMESPACES
 
 click.disable_unicode_literals_warning = True
@@ -20,6 +23,27 @@ click.disable_unicode_literals_warning = True
 ALLOWED_C_SUBS = ['c', 'c01', 'c02', 'c03', 'c04', 'c05', 'c06', 'c07',
                   'c08', 'c09', 'c10', 'c11', 'c12']
 
+FILEGRP_TAG = '{%s}fileGrp' % NAMESPACES['mets']
+FILE_TAG = '{%s}file' % NAMESPACES['mets']
+FLOCAT_TAG = '{%s}FLocat' % NAMESPACES['mets']
+HREF_ATTRIBUTE = '{%s}href' % NAMESPACES['xlink']
+
+FILE_BY_HREF_XPATH = ET.XPath(
+    '//mets:fileGrp/mets:file/mets:FLocat[@xlink:href=$href]/..',
+    namespaces=NAMESPACES)
+
+# Compiled XPath expressions for reading EAD3 metadata
+ARCHDESC_LABEL_XPATH = ET.XPath(
+    '//ead3:archdesc/@otherlevel | //ead3:archdesc/@level',
+    namespaces=NAMESPACES)
+ARCHDESC_DSC_XPATH = ET.XPath('//ead3:archdesc/ead3:dsc',
+                              namespaces=NAMESPACES)
+DSC_CHILDREN_XPATH = ET.XPath('//ead3:dsc/*', namespaces=NAMESPACES)
+C_LABEL_XPATH = ET.XPath('./@otherlevel | ./@level')
+DID_CHILDREN_XPATH = ET.XPath('./ead3:did/*', namespaces=NAMESPACES)
+DAO_HREF_XPATH = ET.XPath('./ead3:dao/@href', namespaces=NAMESPACES)
+HREF_XPATH = ET.XPath('./@href')
+
 
 def ead3_ns(tag):
     """Get tag with EAD3 namespace
@@ -53,7 +77,8 @@ def main(workspace, structmap_type, root_type, dmdsec_loc, stdout):
     """Tool for generating METS file section and structural map based on
     created/imported administrative metada and descriptive metadata.
     The script will also add order of the file to the structural map
-    (via pickle file), if --order argument was used in import_object script.
+    (via properties file), if --order argument was used in import_object
+    script.
     """
     compile_structmap(workspace, structmap_type, root_type, dmdsec_loc, stdout)
 
@@ -67,20 +92,25 @@ def compile_structmap(workspace="./workspace/", structmap_type=None,
     """
     filelist = get_objectlist(workspace)
 
+    # The MD reference file is not modified during the run, so it is read
+    # only once
+    references = md_reference_index(workspace)
+
     if structmap_type == 'EAD3-logical':
         # If structured descriptive metadata for structMap divs is used, also
         # the fileSec element (apparently?) is different. The
         # create_ead3_structmap function populates the fileGrp element.
         filegrp = mets.filegrp()
         filesec_element = mets.filesec(child_elements=[filegrp])
-        filesec = mets.mets(child_elements=[filesec_element])
+        filesec = ET.ElementTree(mets.mets(child_elements=[filesec_element]))
 
-        structmap = create_ead3_structmap(dmdsec_loc, workspace,
-                                          filegrp, filelist, structmap_type)
+        structmap = create_ead3_structmap(dmdsec_loc, workspace, filegrp,
+                                          filelist, structmap_type,
+                                          references=references)
     else:
-        filesec = create_filesec(workspace, filelist)
-        structmap = create_structmap(workspace, filesec.getroot(),
-                                     filelist, structmap_type, root_type)
+        (filesec, structmap) = create_filesec_and_structmap(
+            workspace, filelist, structmap_type, root_type,
+            references=references)
 
     if stdout:
         print(xml_utils.serialize(filesec).decode("utf-8"))
@@ -89,37 +119,70 @@ def compile_structmap(workspace="./workspace/", structmap_type=None,
     output_sm_file = os.path.join(workspace, 'structmap.xml')
     output_fs_file = os.path.join(workspace, 'filesec.xml')
 
-    if not os.path.exists(os.path.dirname(output_sm_file)):
-        os.makedirs(os.path.dirname(output_sm_file))
-
-    if not os.path.exists(os.path.dirname(output_fs_file)):
-        os.makedirs(os.path.dirname(output_fs_file))
+    # Both output files are written to the workspace directory
+    if not os.path.exists(workspace):
+        os.makedirs(workspace)
 
-    with open(output_sm_file, 'wb+') as outfile:
-        outfile.write(xml_utils.serialize(structmap))
+    structmap.write(output_sm_file,
+                    pretty_print=True,
+                    xml_declaration=True,
+                    encoding='UTF-8')
 
-    with open(output_fs_file, 'wb+') as outfile:
-        outfile.write(xml_utils.serialize(filesec))
+    filesec.write(output_fs_file,
+                  pretty_print=True,
+                  xml_declaration=True,
+                  encoding='UTF-8')
 
     print("compile_structmap created files: %s %s" % (output_sm_file,
                                                       output_fs_file))
 
 
+def create_filesec_and_structmap(workspace, filelist, type_attr=None,
+                                 root_type=None, references=None):
+    """Creates METS document element trees that contain fileSec element
+    and structural map. The file identifiers are collected while the
+    fileSec is created and used directly in the structural map.
+
+    :param workspace: directory from which some files are searhed
+    :param filelist: Sorted list of digital objects (file paths)
+    :param type_attr: TYPE attribute of structMap element
+    :param root_type: TYPE attribute of root div element
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
+    :returns: a tuple of fileSec and structural map element trees
+    """
+    if references is None:
+        references = md_reference_index(workspace)
+
+    filegrp = mets.filegrp()
+    filesec = mets.filesec(child_elements=[filegrp])
+
+    fileids = create_filegrp(workspace, filegrp, filelist,
+                             references=references)
+
+    mets_element = mets.mets(child_elements=[filesec])
+    ET.cleanup_namespaces(mets_element)
+
+    structmap = create_structmap(workspace, filesec, filelist, type_attr,
+                                 root_type, fileids=fileids,
+                                 references=references)
+
+    return (ET.ElementTree(mets_element), structmap)
+
+
 def create_filesec(workspace, filelist):
     """Creates METS document element tree that contains fileSec element.
     """
     filegrp = mets.filegrp()
     filesec = mets.filesec(child_elements=[filegrp])
-
     create_filegrp(workspace, filegrp, filelist)
-
     mets_element = mets.mets(child_elements=[filesec])
     ET.cleanup_namespaces(mets_element)
     return ET.ElementTree(mets_element)
 
 
 def create_structmap(workspace, filesec, filelist, type_attr=None,
-                     root_type=None):
+                     root_type=None, fileids=None, references=None):
     """Creates METS document element tree that contains structural map.
 
     :param workspace: directory from which some files are searhed
@@ -127,11 +190,21 @@ def create_structmap(workspace, filesec, filelist, type_attr=None,
     :param filelist: Sorted list of digital objects (file paths)
     :param type_attr: TYPE attribute of structMap element
     :param root_type: TYPE attribute of root div element
+    :param fileids: dict of file identifiers keyed by file path, read from
+                    filesec if None
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
     :returns: structural map element
     """
+    if fileids is None:
+        fileids = get_fileids(filesec)
+    if references is None:
+        references = md_reference_index(workspace)
 
-    amdids = get_md_references(workspace, directory='.')
-    dmdids = get_md_references(workspace, directory='.', ref_type='dmd')
+    amdids = get_md_references(workspace, directory='.',
+                               references=references)
+    dmdids = get_md_references(workspace, directory='.', ref_type='dmd',
+                               references=references)
 
     if type_attr == 'Directory-physical':
         container_div = mets.div(type_attr='directory', label='.',
@@ -144,8 +217,8 @@ def create_structmap(workspace, filesec, filelist, type_attr=None,
     structmap = mets.structmap(type_attr=type_attr)
     structmap.append(container_div)
     divs = div_structure(filelist)
-    create_div(workspace, divs, container_div, filesec,
-               filelist, type_attr=type_attr)
+    create_div(workspace, divs, container_div, fileids,
+               set(filelist), type_attr=type_attr, references=references)
 
     mets_element = mets.mets(child_elements=[structmap])
     ET.cleanup_namespaces(mets_element)
@@ -160,11 +233,14 @@ def div_structure(filelist):
     """
     divs = tree()
     for amd_file in filelist:
-        add(divs, amd_file.split('/'))
+        node = divs
+        for part in amd_file.split('/'):
+            node = node[part]
     return divs
 
 
-def create_ead3_structmap(descfile, workspace, filegrp, filelist, type_attr):
+def create_ead3_structmap(descfile, workspace, filegrp, filelist, type_attr,
+                          references=None):
     """Create structmap based on ead3 descriptive metadata structure.
 
     :desc_file: EAD3 descriptive metadata file
@@ -173,29 +249,36 @@ def create_ead3_structmap(descfile, workspace, filegrp, filelist, type_attr):
     :filegrp: fileGrp element
     :filelist: Sorted list of digital objects (file paths)
     :type_attr: TYPE attribute of structMap element
+    :references: MD reference index, see read_md_references(). Read from
+                 workspace if None.
     """
+    if references is None:
+        references = md_reference_index(workspace)
+
     structmap = mets.structmap(type_attr=type_attr)
     container_div = mets.div(type_attr='logical')
 
     root = ET.parse(descfile).getroot()
 
     try:
-        label = root.xpath(("//ead3:archdesc/@otherlevel | "
-                            "//ead3:archdesc/@level"),
-                           namespaces=NAMESPACES)[0]
+        label = ARCHDESC_LABEL_XPATH(root)[0]
     except IndexError:
         label = 'archdesc'
 
-    amdids = get_md_references(workspace, directory='.')
-    dmdids = get_md_references(workspace, directory='.', ref_type='dmd')
+    amdids = get_md_references(workspace, directory='.',
+                               references=references)
+    dmdids = get_md_references(workspace, directory='.', ref_type='dmd',
+                               references=references)
 
     div_ead = mets.div(type_attr='archdesc', label=label, dmdid=dmdids,
                        admid=amdids)
 
-    if len(root.xpath("//ead3:archdesc/ead3:dsc", namespaces=NAMESPACES)) > 0:
-        for elem in root.xpath("//ead3:dsc/*", namespaces=NAMESPACES):
+    if len(ARCHDESC_DSC_XPATH(root)) > 0:
+        file_index = filelist_index(filelist)
+        for elem in DSC_CHILDREN_XPATH(root):
             if ET.QName(elem.tag).localname in ALLOWED_C_SUBS:
-                ead3_c_div(elem, div_ead, filegrp, workspace, filelist)
+                ead3_c_div(elem, div_ead, filegrp, workspace, filelist,
+                           file_index, references)
 
     container_div.append(div_ead)
     structmap.append(container_div)
@@ -204,7 +287,8 @@ def create_ead3_structmap(descfile, workspace, filegrp, filelist, type_attr):
     return ET.ElementTree(mets_element)
 
 
-def ead3_c_div(parent, structmap, filegrp, workspace, filelist):
+def ead3_c_div(parent, structmap, filegrp, workspace, filelist,
+               file_index=None, references=None):
     """Create div elements based on ead3 c elements. Fptr elements are
     created based on ead dao elements. The Ead3 elements tags are put
     into @type and the @level or @otherlevel attributes from ead3 will
@@ -215,11 +299,12 @@ def ead3_c_div(parent, structmap, filegrp, workspace, filelist):
     :filegrp: fileGrp element
     :workspace: Workspace path
     :filelist: Sorted list of digital objects (file paths)
+    :file_index: Index of filelist created with filelist_index(), or None
+    :references: MD reference index, see read_md_references(), or None
     """
 
     try:
-        label = parent.xpath(("./@otherlevel | ./@level"),
-                             namespaces=NAMESPACES)[0]
+        label = C_LABEL_XPATH(parent)[0]
     except IndexError:
         label = ET.QName(parent.tag).localname
 
@@ -227,30 +312,37 @@ def ead3_c_div(parent, structmap, filegrp, workspace, filelist):
 
     for elem in parent.findall("./*"):
         if ET.QName(elem.tag).localname in ALLOWED_C_SUBS:
-            ead3_c_div(elem, c_div, filegrp, workspace, filelist)
+            ead3_c_div(elem, c_div, filegrp, workspace, filelist,
+                       file_index, references)
 
     hrefs = collect_dao_hrefs(parent)
     c_div = add_fptrs_div_ead(
         c_div=c_div, hrefs=hrefs, filelist=filelist,
-        filegrp=filegrp, workspace=workspace)
+        filegrp=filegrp, workspace=workspace, file_index=file_index,
+        references=references)
 
     structmap.append(c_div)
 
 
-def add_file_to_filesec(workspace, path, filegrp):
+def add_file_to_filesec(workspace, path, filegrp, references=None):
     """Add file element to fileGrp element given as parameter.
 
     :param workspace: Workspace directorye from which administrative MD
                       files and amd reference files searched.
     :param path: url encoded path of the file
     :param lxml.etree.Element filegrp: fileGrp element
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
     :param str returns: id of file added to fileGrp
     :returns: unique identifier of file element
     """
+    if references is None:
+        references = md_reference_index(workspace)
+
     fileid = '_{}'.format(uuid4())
 
     # Create list of IDs of amdID elements
-    amdids = get_md_references(workspace, path=path)
+    amdids = get_md_references(workspace, path=path, references=references)
 
     # Create XML element and add it to fileGrp
     file_el = mets.file_elem(
@@ -262,11 +354,12 @@ def add_file_to_filesec(workspace, path, filegrp):
         groupid=None
     )
 
-    streams = get_objectlist(workspace, path)
+    streams = get_streams(workspace, path, references=references)
     if streams:
         for stream in streams:
             stream_ids = get_md_references(workspace, path=path,
-                                           stream=stream)
+                                           stream=stream,
+                                           references=references)
             stream_el = mets.stream(admid_elements=stream_ids)
             file_el.append(stream_el)
 
@@ -284,17 +377,31 @@ def get_fileid(filesec, path):
     :returns: file element identifier
     """
     encoded_path = encode_path(path, safe='/')
-    element = filesec.xpath(
-        '//mets:fileGrp/mets:file/mets:FLocat[@xlink:href="file://%s"]/..'
-        % encoded_path,
-        namespaces=NAMESPACES
-    )[0]
+    element = FILE_BY_HREF_XPATH(filesec, href='file://%s' % encoded_path)[0]
 
     return element.attrib['ID']
 
 
+def get_fileids(filesec):
+    """Collect the ID attributes of all file elements in fileSec.
+
+    :param lxml.etree Element filesec: fileSec element
+    :returns: dict mapping file paths to file element identifiers
+    """
+    fileids = {}
+    for filegrp in filesec.iter(FILEGRP_TAG):
+        for file_el in filegrp.iterchildren(FILE_TAG):
+            for flocat in file_el.iterchildren(FLOCAT_TAG):
+                href = flocat.get(HREF_ATTRIBUTE)
+                if href and href.startswith('file://'):
+                    path = decode_path(href[len('file://'):])
+                    fileids.setdefault(path, file_el.attrib['ID'])
+
+    return fileids
+
+
 def get_md_references(workspace, path=None, stream=None, directory=None,
-                      ref_type='amd'):
+                      ref_type='amd', references=None):
     """If MD reference file exists in workspace, read
     the MD IDs that should be referenced for the file, stream or
     directory in question. MD reference references to either an
@@ -305,49 +412,94 @@ def get_md_references(workspace, path=None, stream=None, directory=None,
     :stream: stream index for which MD IDs are read
     :directory: path of the directory for which MD IDs are read
     :ref_type: type of metadata section, e.g. amd or dmd
+    :references: MD reference index, see read_md_references(). Read from
+                 workspace if None.
     :returns: a set of administrative MD IDs
     """
-    reference_file = os.path.join(workspace, 'md-references.xml')
-    amd_ids = []
-
-    if os.path.isfile(reference_file):
-        element_tree = ET.parse(reference_file)
-        if directory:
-            directory = os.path.normpath(directory)
-            reference_elements = element_tree.xpath(
-                '/mdReferences/mdReference'
-                '[@directory="%s" and @ref_type="%s"]' % (
-                    directory, ref_type)
-            )
-        elif stream is None:
-            reference_elements = element_tree.xpath(
-                '/mdReferences/mdReference[@file="%s" '
-                'and not(@stream)]' % path
-            )
-        else:
-            reference_elements = element_tree.xpath(
-                '/mdReferences/mdReference[@file="%s" '
-                'and @stream="%s"]' % (path, stream)
-            )
-        amd_ids = [element.text for element in reference_elements]
+    if references is None:
+        references = md_reference_index(workspace)
+    if directory:
+        key = ('directory', os.path.normpath(directory), ref_type)
+    elif stream is None:
+        key = ('file', path, None)
+    else:
+        key = ('file', path, six.text_type(stream))
+
+    return set(references.get(key, []))
+
 
-    return set(amd_ids)
+def get_streams(workspace, path, references=None):
+    """Return the streams of a file, which have MD references.
 
+    :workspace: path to workspace directory
+    :path: path of the file
+    :references: MD reference index, see read_md_references(). Read from
+                 workspace if None.
+    :returns: Sorted list of stream indexes
+    """
+    if references is None:
+        references = md_reference_index(workspace)
+    return sorted(set(references.get(('streams', path), [])))
 
-def create_div(workspace, divs, parent, filesec, filelist, path='',
-               type_attr=None):
+
+def md_reference_index(workspace):
+    """Read the MD reference index from md-references.xml of the workspace.
+
+    :workspace: path to workspace directory
+    :returns: MD reference dict, see read_md_references()
+    """
+    return read_md_references(os.path.join(workspace, 'md-references.xml'))
+
+
+def read_md_references(reference_file):
+    """Read MD reference file into a dict, which maps ('file', path, stream)
+    and ('directory', path, ref_type) tuples to lists of MD IDs. Stream is
+    None for references of the file itself. The streams of each file are
+    listed under ('streams', path) keys.
+
+    :reference_file: path to MD reference file
+    :returns: MD reference dict, empty if the reference file does not exist
+    """
+    if not os.path.isfile(reference_file):
+        return {}
+
+    root = ET.parse(reference_file).getroot()
+    references = defaultdict(list)
+    for element in root.iterchildren('mdReference'):
+        if element.get('file') is not None:
+            key = ('file', element.get('file'), element.get('stream'))
+            references[key].append(element.text)
+            if element.get('stream') is not None:
+                references[('streams', element.get('file'))].append(
+                    element.get('stream'))
+        if element.get('directory') is not None and \
+                element.get('ref_type') is not None:
+            key = ('directory', element.get('directory'),
+                   element.get('ref_type'))
+            references[key].append(element.text)
+
+    return dict(references)
+
+
+def create_div(workspace, divs, parent, fileids, filelist, path='',
+               type_attr=None, references=None):
     """Recursively create fileSec and structmap divs based on directory
     structure.
 
     :param workspace: Workspace path
     :param divs: Current directory or file in directory structure walkthrough
     :param parent: Parent element in structMap
-    :param filesec: filesec element
-    :param filelist: Sorted list of digital objects (file paths)
+    :param fileids: dict of file identifiers keyed by file path
+    :param filelist: Set of digital objects (file paths)
     :param path: Current path in directory structure walkthrough
     :param type_attr: Structmap type
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
     :returns: ``None``
     """
+    if references is None:
+        references = md_reference_index(workspace)
+
     fptr_list = []
     property_list = []
     div_list = []
@@ -355,9 +507,10 @@ def create_div(workspace, divs, parent, filesec, filelist, path='',
         div_path = os.path.join(path, div)
         # It's a file, lets create file+fptr elements
         if div_path in filelist:
-            fileid = get_fileid(filesec, div_path)
+            fileid = fileids[div_path]
             fptr = mets.fptr(fileid)
-            div_el = add_file_div(workspace, div_path, fptr)
+            div_el = add_file_div(workspace, div_path, fptr,
+                                  references=references)
             if div_el is not None:
                 property_list.append(div_el)
             else:
@@ -365,10 +518,11 @@ def create_div(workspace, divs, parent, filesec, filelist, path='',
 
         # It's not a file, lets create a div element
         else:
-            div_path = os.path.join(path, div)
-            amdids = get_md_references(workspace, directory=div_path)
+            amdids = get_md_references(workspace, directory=div_path,
+                                       references=references)
             dmdsec_id = get_md_references(workspace, directory=div_path,
-                                          ref_type='dmd')
+                                          ref_type='dmd',
+                                          references=references)
             if type_attr == 'Directory-physical':
                 div_el = mets.div(type_attr='directory', label=div,
                                   dmdid=dmdsec_id, admid=amdids)
@@ -376,42 +530,50 @@ def create_div(workspace, divs, parent, filesec, filelist, path='',
                 div_el = mets.div(type_attr=div, dmdid=dmdsec_id,
                                   admid=amdids)
             div_list.append(div_el)
-            create_div(workspace, divs[div], div_el, filesec, filelist,
-                       div_path, type_attr)
+            create_div(workspace, divs[div], div_el, fileids, filelist,
+                       div_path, type_attr, references)
 
     # Add fptr list first, then div list
-    for fptr_elem in fptr_list:
-        parent.append(fptr_elem)
-    for div_elem in property_list:
-        parent.append(div_elem)
-    for div_elem in div_list:
-        parent.append(div_elem)
+    parent.extend(fptr_list)
+    parent.extend(property_list)
+    parent.extend(div_list)
 
 
-def create_filegrp(workspace, filegrp, filelist):
+def create_filegrp(workspace, filegrp, filelist, references=None):
     """Add files to fileSec under fileGrp element.
 
     :param workspace: Workspace path
     :param filegrp: filegrp element in fileSec
     :param filelist: Set of digital objects (file paths)
-    :returns: ``None``
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
+    :returns: dict of file identifiers keyed by file path
     """
+    if references is None:
+        references = md_reference_index(workspace)
+
+    fileids = {}
     for path in filelist:
-        add_file_to_filesec(workspace, path, filegrp)
+        fileids[path] = add_file_to_filesec(workspace, path, filegrp,
+                                            references)
+
+    return fileids
 
 
-def add_file_div(workspace, path, fptr, type_attr='file'):
+def add_file_div(workspace, path, fptr, type_attr='file', references=None):
     """Create a div element with file properties
 
     :param properties: File properties
     :param path: File path
     :param fptr: Element fptr for file
     :param type_attr: The TYPE attribute value for the div
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
 
     :returns: Div element with properties or None
     """
 
-    properties = file_properties(workspace, path)
+    properties = file_properties(workspace, path, references)
     if properties and 'order' in properties:
         div_el = mets.div(type_attr=type_attr,
                           order=properties['order'])
@@ -421,35 +583,38 @@ def add_file_div(workspace, path, fptr, type_attr='file'):
     return None
 
 
-def file_properties(workspace, path):
-    """Return file properties from the pickle data file
+def file_properties(workspace, path, references=None):
+    """Return file properties from the JSON properties file, or from the
+    pickle data file if the workspace does not contain a properties file
+    for the file.
 
     :param properties: File properties
     :param path: File path
+    :param references: MD reference index, see read_md_references(). Read
+                       from workspace if None.
 
     :returns: A dict with properties or None
     """
+    for amdref in get_md_references(workspace, path=path,
+                                    references=references):
+        json_name = os.path.join(
+            workspace, '{}-properties.json'.format(amdref[1:]))
+        if os.path.isfile(json_name):
+            with open(json_name) as json_file:
+                return json.load(json_file) or None
 
-    pkl_name = None
-    for amdref in get_md_references(workspace, path=path):
         pkl_name = os.path.join(
             workspace, '{}-scraper.pkl'.format(amdref[1:]))
         if os.path.isfile(pkl_name):
-            break
-
-    if pkl_name is None or not os.path.isfile(pkl_name):
-        return None
+            with open(pkl_name, 'rb') as pkl_file:
+                file_metadata_dict = pickle.load(pkl_file)
+            return file_metadata_dict[0].get('properties')
 
-    with open(pkl_name, 'rb') as pkl_file:
-        file_metadata_dict = pickle.load(pkl_file)
-
-    if 'properties' not in file_metadata_dict[0]:
-        return None
-
-    return file_metadata_dict[0]['properties']
+    return None
 
 
-def add_fptrs_div_ead(c_div, hrefs, filelist, filegrp, workspace):
+def add_fptrs_div_ead(c_div, hrefs, filelist, filegrp, workspace,
+                      file_index=None, references=None):
     """Creates fptr elements for hrefs. If the files contain
     file properties, like ordering data, the data is written to the
     parent div element.
@@ -457,23 +622,39 @@ def add_fptrs_div_ead(c_div, hrefs, filelist, filegrp, workspace):
     the hrefs need to be split into own div elements since the ORDER
     attribute is at the div level.
 
+    An href is matched to a file whose trailing path components equal the
+    href, e.g. 'file.txt' matches 'data/file.txt' even if 'data/a_file.txt'
+    is listed first. Only if no such file exists, the href is matched to the
+    first file of filelist that contains it as a substring.
+
     :c_div: The div element as lxml.etree
     :hrefs: a list of hrefs
     :filelist: Sorted list of digital objects (file paths)
     :filegrp: fileGrp element
     :workspace: Workspace path
+    :file_index: Index of filelist created with filelist_index(). Created
+                 from filelist if None.
+    :references: MD reference index, see read_md_references(). Read from
+                 workspace if None.
 
     :returns: The modified c_div element
     """
+    if file_index is None:
+        file_index = filelist_index(filelist)
+    if references is None:
+        references = md_reference_index(workspace)
+
     for href in hrefs:
-        amd_file = [x for x in filelist if href in x]
+        amd_file = file_index.get(href)
+        if amd_file is None:
+            amd_file = next((x for x in filelist if href in x), None)
 
         # href strings that do not match any file don't add anything new
-        if not amd_file:
+        if amd_file is None:
             break
-        amd_file = amd_file[0]
-        properties = file_properties(workspace, amd_file)
-        fileid = add_file_to_filesec(workspace, amd_file, filegrp)
+        properties = file_properties(workspace, amd_file, references)
+        fileid = add_file_to_filesec(workspace, amd_file, filegrp,
+                                     references)
         fptr = mets.fptr(fileid=fileid)
 
         if properties and 'order' in properties:
@@ -483,7 +664,8 @@ def add_fptrs_div_ead(c_div, hrefs, filelist, filegrp, workspace):
             # div element
             if len(hrefs) > 1:
                 file_div = add_file_div(
-                    workspace, amd_file, fptr, type_attr='dao')
+                    workspace, amd_file, fptr, type_attr='dao',
+                    references=references)
                 c_div.append(file_div)
             else:
                 c_div.attrib['ORDER'] = properties['order']
@@ -494,6 +676,23 @@ def add_fptrs_div_ead(c_div, hrefs, filelist, filegrp, workspace):
     return c_div
 
 
+def filelist_index(filelist):
+    """Index file paths by their trailing path components, e.g.
+    'a/b/c.txt' can be found with keys 'a/b/c.txt', 'b/c.txt' and 'c.txt'.
+    If several files have the same key, the first of them is used.
+
+    :filelist: Sorted list of digital objects (file paths)
+    :returns: A dict mapping path suffixes to file paths
+    """
+    file_index = {}
+    for path in filelist:
+        parts = path.split('/')
+        for i in range(len(parts)):
+            file_index.setdefault('/'.join(parts[i:]), path)
+
+    return file_index
+
+
 def collect_dao_hrefs(ead3_c):
     """Returns the href attribute values from ead3 dao elements.
 
@@ -501,15 +700,13 @@ def collect_dao_hrefs(ead3_c):
     :returns: A list of hrefs
     """
     hrefs = []
-    for elem in ead3_c.xpath("./ead3:did/*", namespaces=NAMESPACES):
+    for elem in DID_CHILDREN_XPATH(ead3_c):
         if ET.QName(elem.tag).localname in ['dao', 'daoset']:
             if ET.QName(elem.tag).localname == 'daoset':
-                for dao_href in elem.xpath(
-                        "./ead3:dao/@href",
-                        namespaces=NAMESPACES):
+                for dao_href in DAO_HREF_XPATH(elem):
                     hrefs.append(dao_href.lstrip('/'))
             else:
-                hrefs.append(elem.xpath("./@href")[0].lstrip('/'))
+                hrefs.append(HREF_XPATH(elem)[0].lstrip('/'))
 
     return hrefs
 
@@ -98,6 +98,9 @@ def premis_event(event_type, event_datetime, event_detail, event_outcome,
                  event_target=None):
     """The script creates provenance metadata for the package. The metadata
     contains event and, if given, also agent of the event.
+
+    :returns: Tuple of PREMIS event and agent XML elements. The agent is
+              ``None`` if agent was not given.
     """
     (directory, event_file) = event_target_path(base_path, event_target)
 
@@ -113,6 +116,7 @@ def premis_event(event_type, event_datetime, event_detail, event_outcome,
         if stdout:
             print(xml_helpers.utils.serialize(agent).decode("utf-8"))
     else:
+        agent = None
         agent_identifier = None
 
     event = create_premis_event(
@@ -131,6 +135,8 @@ def premis_event(event_type, event_datetime, event_detail, event_outcome,
     if stdout:
         print(xml_helpers.utils.serialize(event).decode("utf-8"))
 
+    return (event, agent)
+
 
 def event_target_path(base_path, event_target=None):
     """Returns the path to the event_target based on the base_path and
@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import copy
 import hashlib
+import json
 import os
 import pickle
 import sys
@@ -225,6 +226,17 @@ def generate_digest(etree):
     return hashlib.md5(xml_data).hexdigest()
 
 
+def md_filename(digest, mdtype):
+    """Return the name of the METS XML file, which contains the metadata
+    with given digest.
+
+    :digest: Digest of the metadata, see generate_digest()
+    :mdtype: Type of the metadata, e.g. 'PREMIS:EVENT'
+    :returns: URL encoded filename
+    """
+    return encode_path("%s-%s-amd.xml" % (digest, mdtype))
+
+
 def get_objectlist(workspace, file_path=None):
     """Get unique and sorted list of files or streams from md-references.xml
 
@@ -333,19 +345,18 @@ class MdCreator(object):
 
         # Add all the references
         for ref in self.references:
-            reference = lxml.etree.Element('mdReference')
+            reference = lxml.etree.SubElement(references, 'mdReference')
             reference.text = ref['md_id']
-            for key in ref:
+            for key, value in six.iteritems(ref):
                 if key == 'md_id':
                     pass
-                elif isinstance(ref[key], six.binary_type):
+                elif isinstance(value, six.binary_type):
                     reference.set(
-                        key, ref[key].decode(sys.getfilesystemencoding()))
-                elif isinstance(ref[key], six.text_type):
-                    reference.set(key, ref[key])
-                elif ref[key]:
-                    reference.set(key, six.text_type(ref[key]))
-                references.append(reference)
+                        key, value.decode(sys.getfilesystemencoding()))
+                elif isinstance(value, six.text_type):
+                    reference.set(key, value)
+                elif value:
+                    reference.set(key, six.text_type(value))
 
         # Write reference list file
         references_tree.write(reference_file,
@@ -377,7 +388,7 @@ class MdCreator(object):
         """
         digest = generate_digest(metadata)
         suffix = othermdtype if othermdtype else mdtype
-        filename = encode_path("%s-%s-amd.xml" % (digest, suffix))
+        filename = md_filename(digest, suffix)
         md_id = '_{}'.format(digest)
         filename = os.path.join(self.workspace, filename)
 
@@ -409,7 +420,10 @@ class MdCreator(object):
         return md_id, filename
 
     def write_dict(self, file_metadata_dict, premis_amd_id):
-        """Write streams to a file for further scripts.
+        """Write streams to a file for further scripts. The file properties
+        are also written to a separate JSON file, so that they can be read
+        without loading the whole streams dict.
+
         :file_metadata_dict: File metadata dict
         :premis_amd_id: The AMDID of corresponding premis FILE object
         """
@@ -425,6 +439,14 @@ class MdCreator(object):
                 pickle.dump(file_metadata_dict, outfile)
             print("Wrote technical data to: %s" % (outfile.name))
 
+        filename = encode_path("%s-properties.json" % digest)
+        filename = os.path.join(self.workspace, filename)
+
+        if not os.path.exists(filename):
+            with open(filename, 'w') as outfile:
+                json.dump(file_metadata_dict[0].get('properties', {}),
+                          outfile)
+
     def write(self, mdtype="type", mdtypeversion="version", othermdtype=None,
               section=None, stdout=False, file_metadata_dict=None):
         """Write METS XML and md-reference files. First, METS XML files are
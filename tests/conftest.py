@@ -75,8 +75,17 @@ def testpath(request):
     return temp_path
 
 
+@pytest.fixture(scope="session")
+def cli_runner():
+    """Click test runner shared by all tests in the session.
+
+    :returns: Click CliRunner instance
+    """
+    return CliRunner()
+
+
 @pytest.fixture(scope="function")
-def run_cli():
+def run_cli(cli_runner):
     """Executes given Click interface with given arguments
     """
     def _run_cli(cli_func, args, success=True):
@@ -91,8 +100,7 @@ def run_cli():
         :returns: Command result
         :rtype: click.testing.Result
         """
-        runner = CliRunner()
-        result = runner.invoke(cli_func, args)
+        result = cli_runner.invoke(cli_func, args)
         if success:
             assert result.exit_code == 0, result
         else:
@@ -2,6 +2,9 @@
 from __future__ import unicode_literals
 
 import os
+import shutil
+
+import pytest
 
 import lxml.etree as ET
 from siptools.scripts import (compile_mets, compile_structmap, import_object,
@@ -153,6 +156,66 @@ def test_compile_mets_cleanup_ok(testpath, run_cli):
                       namespaces=NAMESPACES)[0].text == 'CSC'
 
 
+
+def test_clean_metsparts(testpath):
+    """Test that clean_metsparts removes the work files, but keeps digital
+    objects whose names resemble the work files.
+    """
+    digest = 'd41d8cd98f00b204e9800998ecf8427e'
+    os.makedirs(os.path.join(testpath, 'data'))
+    work_files = ['md-references.xml', '%s-scraper.pkl' % digest,
+                  '%s-properties.json' % digest]
+    objects = ['data/app-properties.json', '%s-properties.json.txt' % digest]
+    for name in work_files + objects:
+        with open(os.path.join(testpath, name), 'w') as outfile:
+            outfile.write('{}')
+
+    compile_mets.clean_metsparts(testpath)
+
+    for name in work_files:
+        assert not os.path.exists(os.path.join(testpath, name))
+    for name in objects:
+        assert os.path.isfile(os.path.join(testpath, name))
+
+def test_compile_mets_stdout(testpath, run_cli):
+    """Test that the METS document is printed to stdout as XML."""
+    create_test_data(testpath, run_cli)
+    arguments = ['ch',
+                 'CSC',
+                 'urn:uuid:89e92a4f-f0e4-4768-b785-4781d3299b20',
+                 '--workspace', testpath,
+                 '--stdout']
+    result = run_cli(compile_mets.main, arguments)
+
+    # The printed document is followed by other output of the script
+    end = result.output.index('</mets:mets>') + len('</mets:mets>')
+    printed_root = ET.fromstring(result.output[:end].encode('utf-8'))
+    written_root = ET.parse(os.path.join(testpath, 'mets.xml')).getroot()
+
+    assert printed_root.tag == '{%s}mets' % NAMESPACES['mets']
+    assert printed_root.get('OBJID') == written_root.get('OBJID')
+
+
+def test_compile_mets_default_objid(testpath, run_cli):
+    """Test that a new OBJID is generated for each invocation if --objid is
+    not given.
+    """
+    create_test_data(testpath, run_cli)
+    arguments = ['ch',
+                 'CSC',
+                 'urn:uuid:89e92a4f-f0e4-4768-b785-4781d3299b20',
+                 '--workspace', testpath]
+
+    objids = []
+    for _ in range(2):
+        run_cli(compile_mets.main, arguments)
+        root = ET.parse(os.path.join(testpath, 'mets.xml')).getroot()
+        objids.append(root.get('OBJID'))
+
+    assert objids[0]
+    assert objids[0] != objids[1]
+
+
 def test_compile_mets_fail(testpath, run_cli):
     arguments = ['ch',
                  'CSC',
@@ -166,3 +229,30 @@ def test_compile_mets_fail(testpath, run_cli):
                  '--workspace', testpath]
     result = run_cli(compile_mets.main, arguments, success=False)
     assert isinstance(result.exception, SystemExit)
+
+
+def test_copy_file(testpath):
+    """Test that copy_file creates an identical copy of the source file."""
+    target = os.path.join(testpath, 'test_import.pdf')
+    compile_mets.copy_file('tests/data/test_import.pdf', target)
+
+    with open('tests/data/test_import.pdf', 'rb') as infile:
+        source_data = infile.read()
+    with open(target, 'rb') as infile:
+        assert infile.read() == source_data
+
+
+def test_copy_file_same_file(testpath):
+    """Test that copy_file refuses to copy a file onto itself and leaves
+    the file intact.
+    """
+    path = os.path.join(testpath, 'test_import.pdf')
+    shutil.copy('tests/data/test_import.pdf', path)
+
+    with pytest.raises(shutil.Error):
+        compile_mets.copy_file(path, path)
+
+    with open('tests/data/test_import.pdf', 'rb') as infile:
+        source_data = infile.read()
+    with open(path, 'rb') as infile:
+        assert infile.read() == source_data
@@ -2,12 +2,14 @@
 from __future__ import unicode_literals
 
 import os
+import pickle
 import shutil
 
 import lxml.etree
 import mets
 from siptools.scripts import (compile_structmap, create_audiomd,
                               import_description, import_object, premis_event)
+from siptools.utils import MdCreator, get_objectlist
 from siptools.xml.mets import NAMESPACES
 
 
@@ -119,6 +121,58 @@ def test_get_md_references(testpath):
     assert set(ids) == set(['abcd1234', 'efgh5678'])
 
 
+def test_get_md_references_modified(testpath):
+    """Test that get_md_references finds references that are added to the
+    MD reference file after it has already been read.
+    """
+    shutil.copy('tests/data/sample_md-references.xml',
+                os.path.join(testpath, 'md-references.xml'))
+    ids = compile_structmap.get_md_references(testpath, 'path/to/file1')
+    assert ids == set(['abcd1234'])
+
+    md_creator = MdCreator(testpath)
+    md_creator.add_reference('ijkl9012', 'path/to/file1')
+    md_creator.write_references()
+
+    ids = compile_structmap.get_md_references(testpath, 'path/to/file1')
+    assert ids == set(['abcd1234', 'ijkl9012'])
+
+
+def test_get_streams(testpath):
+    """Test that get_streams returns the sorted and unique stream indexes
+    of a file from the MD reference file.
+    """
+    md_creator = MdCreator(testpath)
+    md_creator.add_reference('abcd1234', 'path/to/file1')
+    md_creator.add_reference('efgh5678', 'path/to/file1', stream='2')
+    md_creator.add_reference('ijkl9012', 'path/to/file1', stream='1')
+    md_creator.add_reference('mnop3456', 'path/to/file1', stream='1')
+    md_creator.add_reference('qrst7890', 'path/to/file2', stream='1')
+    md_creator.write_references()
+
+    assert compile_structmap.get_streams(testpath, 'path/to/file1') == \
+        ['1', '2']
+    assert compile_structmap.get_streams(testpath, 'path/to/file3') == []
+
+
+
+def test_file_properties_pickle(testpath):
+    """Test that file_properties reads the properties from the pickle data
+    file if the workspace does not contain a properties file.
+    """
+    digest = 'd41d8cd98f00b204e9800998ecf8427e'
+    md_creator = MdCreator(testpath)
+    md_creator.add_reference('_%s' % digest, 'path/to/file1')
+    md_creator.write_references()
+    with open(os.path.join(testpath, '%s-scraper.pkl' % digest),
+              'wb') as outfile:
+        pickle.dump([{'properties': {'order': '5'}}], outfile)
+
+    assert compile_structmap.file_properties(testpath, 'path/to/file1') == \
+        {'order': '5'}
+    assert compile_structmap.file_properties(testpath, 'path/to/file2') is \
+        None
+
 def test_othermd_references(testpath, run_cli):
     """Test that main function creates references to othermd-metadata from file
     element in fileSec. A sample workspace contains aMD files, MIX metadata
@@ -135,12 +189,10 @@ def test_othermd_references(testpath, run_cli):
 
     # Read filesec.xml
     mets_document = lxml.etree.parse(os.path.join(workspace, 'filesec.xml'))
-    namespaces = {'mets': "http://www.loc.gov/METS/",
-                  'xlink': "http://www.w3.org/1999/xlink"}
 
     # fileGrp section should contain 3 file elements
     files = mets_document.xpath(
-        '/mets:mets/mets:fileSec/mets:fileGrp/mets:file', namespaces=namespaces
+        '/mets:mets/mets:fileSec/mets:fileGrp/mets:file', namespaces=NAMESPACES
     )
     assert len(files) == 3
 
@@ -157,7 +209,7 @@ def test_othermd_references(testpath, run_cli):
         # Find file element from mets based on filepath
         xpath = '//mets:FLocat[@xlink:href="file://%s"]/parent::mets:file' \
             % filepath
-        file_element = mets_document.xpath(xpath, namespaces=namespaces)
+        file_element = mets_document.xpath(xpath, namespaces=NAMESPACES)
 
         # The file element should have reference to techMD element defined in
         # ``amd_ids`` dictionary
@@ -237,3 +289,40 @@ def test_get_fileid():
 
     assert compile_structmap.get_fileid(filegrp, 'path/to/file name1') \
         == 'identifier1'
+
+
+def test_get_fileids():
+    """Test get_fileids function. Create a fileSec element with few files and
+    test that the file IDs are mapped to the file paths.
+    """
+    files = [mets.file_elem(file_id='identifier%s' % num,
+                            admid_elements=['foo', 'bar'],
+                            loctype='foo',
+                            xlink_href='file://path/to/file+name%s' % num,
+                            xlink_type='foo') for num in range(3)]
+
+    filesec = mets.filesec(child_elements=[
+        mets.filegrp(child_elements=files)])
+
+    assert compile_structmap.get_fileids(filesec) == {
+        'path/to/file name0': 'identifier0',
+        'path/to/file name1': 'identifier1',
+        'path/to/file name2': 'identifier2'
+    }
+
+
+def test_create_filesec_and_structmap_separately(testpath, run_cli):
+    """Test that a structural map created from a separately created fileSec
+    points to the file elements of the fileSec.
+    """
+    create_test_data(testpath, run_cli)
+    filelist = get_objectlist(testpath)
+
+    filesec = compile_structmap.create_filesec(testpath, filelist)
+    structmap = compile_structmap.create_structmap(testpath, filesec,
+                                                   filelist)
+
+    file_ids = filesec.xpath('//mets:file/@ID', namespaces=NAMESPACES)
+    fptr_ids = structmap.xpath('//mets:fptr/@FILEID', namespaces=NAMESPACES)
+    assert len(file_ids) == 1
+    assert fptr_ids == file_ids
@@ -145,3 +145,37 @@ def test_add_fptrs_div_ead(testpath, run_cli, hrefs, length, child_elem,
         assert c_div.xpath('./*')[0].get('TYPE') == 'dao'
     else:
         assert 'ORDER' not in c_div.attrib
+
+
+@pytest.mark.parametrize(('href', 'expected_file'), [
+    ('file.txt', 'data/file.txt'),
+    ('a_file', 'data/a_file.txt')
+], ids=('Path suffix match is preferred over substring match',
+        'Substring match is used if no path suffix matches'))
+def test_add_fptrs_div_ead_match(testpath, href, expected_file):
+    """Tests which file of the file list add_fptrs_div_ead adds to the
+    fileGrp for a dao href.
+    """
+    c_div = mets.div(type_attr='file')
+    filelist = ['data/a_file.txt', 'data/file.txt']
+    filegrp = mets.filegrp()
+    compile_structmap.add_fptrs_div_ead(
+        c_div, [href], filelist, filegrp, testpath)
+
+    hrefs = filegrp.xpath('./mets:file/mets:FLocat/@xlink:href',
+                          namespaces=NAMESPACES)
+    assert hrefs == ['file://%s' % expected_file]
+
+
+def test_filelist_index():
+    """Tests that filelist_index finds files by their trailing path
+    components and prefers the first file of the list.
+    """
+    filelist = ['a/b/file.txt', 'c/file.txt']
+    file_index = compile_structmap.filelist_index(filelist)
+
+    assert file_index['a/b/file.txt'] == 'a/b/file.txt'
+    assert file_index['b/file.txt'] == 'a/b/file.txt'
+    assert file_index['c/file.txt'] == 'c/file.txt'
+    assert file_index['file.txt'] == 'a/b/file.txt'
+    assert 'b/file' not in file_index
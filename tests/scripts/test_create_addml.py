@@ -6,6 +6,7 @@ import os
 import pytest
 
 import lxml.etree as ET
+from scandir import scandir
 import siptools.scripts.create_addml as create_addml
 from siptools.utils import decode_path
 
@@ -97,13 +98,14 @@ def test_create_addml_creator(testpath, isheader, exp_amd_files, exp_fields):
 
     # Check that md-reference and the ADDML-amd files with correct content
     # are created
-    assert os.path.isfile(os.path.join(testpath, 'md-references.xml'))
+    entries = {entry.name: entry for entry in scandir(testpath)}
+    assert entries['md-references.xml'].is_file()
 
     for amd_file_index, exp_amd_file in enumerate(exp_amd_files):
-        amd_file = os.path.join(testpath, exp_amd_file)
-        assert os.path.isfile(amd_file)
+        entry = entries[exp_amd_file]
+        assert entry.is_file()
 
-        root = ET.parse(amd_file)
+        root = ET.parse(entry.path)
         flat_files = root.find(ADDML_NS + "flatFiles")
 
         # Verify the number of child elements in flatFiles
@@ -10,6 +10,7 @@ import sys
 
 import lxml.etree as ET
 import pytest
+from scandir import scandir
 import siptools.scripts.create_audiomd as create_audiomd
 
 AUDIOMD_NS = 'http://www.loc.gov/audioMD/'
@@ -141,15 +142,10 @@ def test_create_audiomd(testpath):
     creator.write()
 
     # Check that md-reference and one AudioMD-amd files are created
-    assert os.path.isfile(os.path.join(testpath, 'md-references.xml'))
-
-    filepath = os.path.join(
-        testpath, 'eae4d239422e21f3a8cfa57bb2afcb9e-AudioMD-amd.xml'
-        # testpath, '704fbd57169eac3af9388e03c89dd919-AudioMD-amd.xml'
-        # testpath, '4dab7d9d5bab960188ea0f25e478cb17-AudioMD-amd.xml'
-    )
-
-    assert os.path.isfile(filepath)
+    entries = {entry.name: entry for entry in scandir(testpath)}
+    assert entries['md-references.xml'].is_file()
+    assert entries['eae4d239422e21f3a8cfa57bb2afcb9e-AudioMD-amd.xml'] \
+        .is_file()
 
 
 def test_main_utf8_files(testpath, run_cli):
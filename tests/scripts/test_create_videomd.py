@@ -11,6 +11,7 @@ import sys
 import pytest
 
 import lxml.etree as ET
+from scandir import scandir
 import siptools.scripts.create_videomd as create_videomd
 from siptools.utils import fsencode_path
 
@@ -173,13 +174,10 @@ def test_create_videomd(testpath):
     creator.write()
 
     # Check that mdreference and one VideoMD-amd files are created
-    assert os.path.isfile(os.path.join(testpath, 'md-references.xml'))
-
-    filepath = os.path.join(
-        testpath, '36260c626dac2f82359d7c22ef378392-VideoMD-amd.xml'
-    )
-
-    assert os.path.isfile(filepath)
+    entries = {entry.name: entry for entry in scandir(testpath)}
+    assert entries['md-references.xml'].is_file()
+    assert entries['36260c626dac2f82359d7c22ef378392-VideoMD-amd.xml'] \
+        .is_file()
 
 
 def test_main_utf8_files(testpath, run_cli):
@@ -4,6 +4,7 @@ from __future__ import unicode_literals
 
 import datetime
 import io
+import json
 import os.path
 import pickle
 
@@ -122,6 +123,11 @@ def test_import_object_order(testpath, run_cli):
     assert 'order' in streams[0]['properties']
     assert streams[0]['properties']['order'] == '5'
 
+    path = output.replace('-PREMIS%3AOBJECT-amd.xml',
+                          '-properties.json')
+    with open(path) as infile:
+        assert json.load(infile) == {'order': '5'}
+
 
 def test_import_object_identifier(testpath, run_cli):
     """Test digital object identifier argument"""
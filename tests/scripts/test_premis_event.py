@@ -6,144 +6,209 @@ import os
 import pytest
 
 import lxml.etree as ET
+from scandir import scandir
 from siptools.scripts import premis_event
+from siptools.utils import generate_digest, md_filename
+from siptools.xml.mets import NAMESPACES
+
+PARSER = ET.XMLParser(remove_blank_text=True)
+
+PREMIS_EVENT_SCHEMA_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'data',
+    'premis_event.rng')
+
+AMDSEC_XPATH = ET.XPath('mets:amdSec', namespaces=NAMESPACES)
+DIRECTORY_REFERENCE_XPATH = ET.XPath(
+    '/mdReferences/mdReference[@directory=$directory]')
+FILE_REFERENCE_XPATH = ET.XPath('/mdReferences/mdReference[@file=$file]')
+
+PREMIS_NS = '{%s}' % NAMESPACES['premis']
+
+# Expected event and agent element contents in the tests
+EVENT_CONTENTS = {
+    PREMIS_NS + 'eventType': 'creation',
+    PREMIS_NS + 'eventDateTime': '2016-10-13T12:30:55',
+    PREMIS_NS + 'eventDetail': 'Testing',
+    PREMIS_NS + 'eventOutcome': 'success',
+    PREMIS_NS + 'eventOutcomeDetailNote': 'Outcome detail'
+}
+AGENT_CONTENTS = {
+    PREMIS_NS + 'agentName': 'Demo Application',
+    PREMIS_NS + 'agentType': 'software'
+}
+
+
+def element_texts(root, tags):
+    """Collect the text of given elements in a single pass over the tree.
+
+    :param root: XML element or tree
+    :param tags: Iterable of element tags in Clark notation
+    :returns: Dict mapping element tags to their text
+    """
+    return {elem.tag: elem.text for elem in root.iter(*tags)}
 
 
-def test_premis_event_ok(testpath, run_cli):
-    """Test that main function produces event.xml and agent.xml files with
-    correct elements.
+@pytest.fixture(scope='module')
+def premis_event_schema():
+    """Load the RelaxNG schema of METS documents that contain a PREMIS
+    event.
+
+    :returns: RelaxNG schema
+    """
+    return ET.RelaxNG(ET.parse(PREMIS_EVENT_SCHEMA_PATH))
+
+
+@pytest.fixture(scope='module')
+def premis_event_outputs(tmpdir_factory, cli_runner):
+    """Run the premis_event script once for each event target used in the
+    tests into a shared workspace. The event targeted to
+    tests/data/structured also has an agent and an event outcome detail.
+
+    :tmpdir_factory: Pytest tmpdir_factory fixture
+    :cli_runner: Shared Click test runner
+    :returns: Tuple of workspace path and the root element of md-references
     """
-    run_cli(premis_event.main, [
+    workspace = str(tmpdir_factory.mktemp('premis_event'))
+
+    common_args = [
         'creation',
         '2016-10-13T12:30:55',
-        '--event_target', 'tests/data/structured',
         '--event_detail', 'Testing',
         '--event_outcome', 'success',
-        '--event_outcome_detail', 'Outcome detail',
-        '--workspace', testpath,
-        '--agent_name', 'Demo Application',
-        '--agent_type', 'software'
-    ])
+        '--workspace', workspace
+    ]
+    for args in (
+            ['--event_target', 'tests/data/structured',
+             '--event_outcome_detail', 'Outcome detail',
+             '--agent_name', 'Demo Application',
+             '--agent_type', 'software'],
+            [],
+            ['--event_target', 'tests/data/test_import.pdf'],
+            ['--event_target', 'tests/data']
+    ):
+        result = cli_runner.invoke(premis_event.main, common_args + args)
+        assert result.exit_code == 0, result
 
-    # Read output files
-    event_xml = ET.parse(
-        os.path.join(
-            testpath,
-            '4a4a5d87842b048eef1c59ab3fef286d-PREMIS%3AEVENT-amd.xml')
-    ).getroot()
-    agent_xml = ET.parse(
-        os.path.join(
-            testpath,
-            'd4e928570d571cb1ba79e3b7ba23cd89-PREMIS%3AAGENT-amd.xml')
+    references = ET.parse(
+        os.path.join(workspace, 'md-references.xml'), PARSER
     ).getroot()
 
-    namespaces = {'mets': 'http://www.loc.gov/METS/',
-                  'premis': 'info:lc/xmlns/premis-v2'}
+    return (workspace, references)
 
-    # Both output files should have one amdSec element
-    assert len(event_xml.findall('mets:amdSec', namespaces=namespaces)) == 1
-    assert len(agent_xml.findall('mets:amdSec', namespaces=namespaces)) == 1
 
-    # Check thait event.xml contains required elements with correct content
-    for element, content in (
-            (".//premis:eventType", 'creation'),
-            (".//premis:eventDateTime", '2016-10-13T12:30:55'),
-            (".//premis:eventDetail", 'Testing'),
-            (".//premis:eventOutcome", 'success'),
-            (".//premis:eventOutcomeDetailNote", 'Outcome detail')
-    ):
-        assert event_xml.findall(element, namespaces=namespaces)[0].text \
-            == content
+def assert_event_and_agent(event, agent):
+    """Assert that PREMIS event and agent have the content given in the
+    tests, and that the event is linked to the agent.
 
-    # Check thait agent.xml contains required elements with correct content
-    for element, content in (
-            (".//premis:agentName", 'Demo Application'),
-            (".//premis:agentType", 'software')
-    ):
-        assert agent_xml.findall(element, namespaces=namespaces)[0].text \
-            == content
+    :event: XML element that contains the PREMIS event
+    :agent: XML element that contains the PREMIS agent
+    """
+    linking_agent_tag = PREMIS_NS + 'linkingAgentIdentifierValue'
+    agent_id_tag = PREMIS_NS + 'agentIdentifierValue'
+    event_texts = element_texts(
+        event, list(EVENT_CONTENTS) + [linking_agent_tag])
+    agent_texts = element_texts(
+        agent, list(AGENT_CONTENTS) + [agent_id_tag])
 
-    # event.xml file should contain link to agent-element in agent.xml file
-    assert \
-        event_xml.findall('.//premis:linkingAgentIdentifierValue',
-                          namespaces=namespaces)[0].text \
-        == \
-        agent_xml.findall('.//premis:agentIdentifierValue',
-                          namespaces=namespaces)[0].text
+    # Check thait event contains required elements with correct content
+    for tag, content in EVENT_CONTENTS.items():
+        assert event_texts[tag] == content
 
+    # Check thait agent contains required elements with correct content
+    for tag, content in AGENT_CONTENTS.items():
+        assert agent_texts[tag] == content
 
-def test_amd_links_root(testpath, run_cli):
-    """Tests that premis_event script writes reference links correctly
-    to the md-references file.
+    # Event should contain link to the agent
+    assert event_texts[linking_agent_tag] == agent_texts[agent_id_tag]
+
+
+def test_premis_event_ok(premis_event_outputs, premis_event_schema):
+    """Test that main function produces event.xml and agent.xml files with
+    correct elements.
     """
-    run_cli(premis_event.main, [
+    workspace = premis_event_outputs[0]
+
+    # Identifiers are excluded from the digests, so the names of the output
+    # files can be computed from any event and agent with the same content
+    expected_event = premis_event.create_premis_event(
+        'creation', '2016-10-13T12:30:55', 'Testing', 'success',
+        'Outcome detail', 'agent-identifier')
+    expected_agent = premis_event.create_premis_agent(
+        'Demo Application', 'software', 'agent-identifier')
+
+    entries = {entry.name: entry for entry in scandir(workspace)}
+    event_entry = entries[
+        md_filename(generate_digest(expected_event), 'PREMIS:EVENT')]
+    agent_entry = entries[
+        md_filename(generate_digest(expected_agent), 'PREMIS:AGENT')]
+
+    # Read output files
+    event_xml = ET.parse(event_entry.path, PARSER).getroot()
+    agent_xml = ET.parse(agent_entry.path, PARSER).getroot()
+
+    # The event file should be a METS document with one amdSec element,
+    # which contains the PREMIS event
+    premis_event_schema.assertValid(event_xml)
+    assert len(AMDSEC_XPATH(agent_xml)) == 1
+
+    assert_event_and_agent(event_xml, agent_xml)
+
+
+def test_premis_event_elements(testpath):
+    """Test that premis_event function returns the created event and agent
+    elements with correct content.
+    """
+    (event, agent) = premis_event.premis_event(
         'creation',
         '2016-10-13T12:30:55',
-        '--event_detail', 'Testing',
-        '--event_outcome', 'success',
-        '--workspace', testpath
-    ])
+        'Testing',
+        'success',
+        event_outcome_detail='Outcome detail',
+        workspace=testpath,
+        agent_name='Demo Application',
+        agent_type='software',
+        event_target='tests/data/structured'
+    )
 
-    ref = os.path.join(testpath, 'md-references.xml')
-    assert os.path.isfile(ref)
+    assert_event_and_agent(event, agent)
 
-    root = ET.parse(ref).getroot()
-    dir_ref = root.xpath("/mdReferences/mdReference")[0].get('directory')
-    assert dir_ref == '.'
+
+def test_amd_links_root(premis_event_outputs):
+    """Tests that premis_event script writes reference links correctly
+    to the md-references file.
+    """
+    references = premis_event_outputs[1]
+    assert len(DIRECTORY_REFERENCE_XPATH(references, directory='.')) == 1
 
 
-def test_amd_links_file(testpath, run_cli):
+def test_amd_links_file(premis_event_outputs):
     """Tests that premis_event script writes reference links correctly
     to the md-references file with a proper file target.
     """
+    references = premis_event_outputs[1]
     target = 'tests/data/test_import.pdf'
-    run_cli(premis_event.main, [
-        'creation',
-        '2016-10-13T12:30:55',
-        '--event_detail', 'Testing',
-        '--event_outcome', 'success',
-        '--workspace', testpath,
-        '--event_target', target
-    ])
-
-    ref = os.path.join(testpath, 'md-references.xml')
-    assert os.path.isfile(ref)
+    assert len(FILE_REFERENCE_XPATH(references, file=target)) == 1
 
-    root = ET.parse(ref).getroot()
-    dir_ref = root.xpath("/mdReferences/mdReference")[0].get('file')
-    assert dir_ref == target
 
-
-def test_amd_links_dir(testpath, run_cli):
+def test_amd_links_dir(premis_event_outputs):
     """Tests that premis_event script writes reference links correctly
     to the md-references file with a directory target.
     """
+    references = premis_event_outputs[1]
     target = 'tests/data'
-    run_cli(premis_event.main, [
-        'creation',
-        '2016-10-13T12:30:55',
-        '--event_detail', 'Testing',
-        '--event_outcome', 'success',
-        '--workspace', testpath,
-        '--event_target', target
-    ])
+    assert len(DIRECTORY_REFERENCE_XPATH(references, directory=target)) == 1
 
-    ref = os.path.join(testpath, 'md-references.xml')
-    assert os.path.isfile(ref)
 
-    root = ET.parse(ref).getroot()
-    dir_ref = root.xpath("/mdReferences/mdReference")[0].get('directory')
-    assert dir_ref == target
-
-
-def test_premis_event_fail(testpath, run_cli):
+@pytest.mark.parametrize('event_outcome',
+                         ['nonsense', '', 'bogus', 'SUCCESS'])
+def test_premis_event_fail(testpath, run_cli, event_outcome):
     """Test that main function raises `SystemExit` if `event_outcome`
     parameter is incorrect."""
 
     result = run_cli(premis_event.main, [
         'creation', '2016-10-13T12:30:55',
         '--event_detail', 'Testing',
-        '--event_outcome', 'nonsense',
+        '--event_outcome', event_outcome,
         '--event_outcome_detail', 'Outcome detail',
         '--workspace', testpath
     ], success=False)
@@ -182,7 +247,7 @@ def test_invalid_event_target_path():
         premis_event.event_target_path('.', 'foo/bar')
 
 
-def test_create_premis_event_file_ok(testpath):
+def test_create_premis_event_file_ok(testpath, premis_event_schema):
     """Test that create_premis_event_file function produces event.xml file with
     correct elements.
     """
@@ -197,22 +262,11 @@ def test_create_premis_event_file_ok(testpath):
 
     assert file_path == os.path.join(testpath, 'creation-event-amd.xml')
 
-    namespaces = {'mets': 'http://www.loc.gov/METS/',
-                  'premis': 'info:lc/xmlns/premis-v2'}
-
-    # Should have one amdSec element
-    assert len(event_xml.findall('mets:amdSec', namespaces=namespaces)) == 1
+    # The document should have the structure of a METS wrapped PREMIS event
+    premis_event_schema.assertValid(event_xml)
 
     # Check thait event.xml contains required elements with correct content
-    for element, content in (
-            (".//premis:eventType", 'creation'),
-            (".//premis:eventDateTime", '2016-10-13T12:30:55'),
-            (".//premis:eventDetail", 'Testing'),
-            (".//premis:eventOutcome", 'success'),
-            (".//premis:eventOutcomeDetailNote", 'Outcome detail')
-    ):
-        assert event_xml.findall(
-            element, namespaces=namespaces)[0].text == content
+    assert element_texts(event_xml, EVENT_CONTENTS) == EVENT_CONTENTS
 
 
 def test_create_premis_agent_file_ok(testpath):
@@ -229,16 +283,8 @@ def test_create_premis_agent_file_ok(testpath):
 
     assert file_path == os.path.join(testpath, 'event-type-agent-amd.xml')
 
-    namespaces = {'mets': 'http://www.loc.gov/METS/',
-                  'premis': 'info:lc/xmlns/premis-v2'}
-
     # Should have one amdSec element
-    assert len(agent_xml.findall('mets:amdSec', namespaces=namespaces)) == 1
+    assert len(AMDSEC_XPATH(agent_xml)) == 1
 
     # Check thait agent.xml contains required elements with correct content
-    for element, content in (
-            (".//premis:agentName", 'Demo Application'),
-            (".//premis:agentType", 'software')
-    ):
-        assert agent_xml.findall(element, namespaces=namespaces)[0].text \
-            == content
+    assert element_texts(agent_xml, AGENT_CONTENTS) == AGENT_CONTENTS
@@ -2,40 +2,43 @@
 """Tests for the utility functions."""
 from __future__ import unicode_literals
 
+import hashlib
 import os
+
+import pytest
+
 import lxml.etree
 import xml_helpers
 import siptools.utils as utils
+from siptools.xml.mets import NAMESPACES
 
+PARSER = lxml.etree.XMLParser(remove_blank_text=True)
 
-def test_encode_path():
-    """Tests for the encode_path function."""
-
-    encoded_path = utils.encode_path('tests/testpath')
-    assert encoded_path == 'tests%2Ftestpath'
+TECHMD_XPATH = lxml.etree.XPath('/mets:mets/mets:amdSec/mets:techMD',
+                                namespaces=NAMESPACES)
+SAMPLE_DATA_XPATH = lxml.etree.XPath('//mets:mdWrap/mets:xmlData/sampleData',
+                                     namespaces=NAMESPACES)
 
-    encoded_path = utils.encode_path(
-        'tests/testpath', suffix='-testsuffix', prefix='testprefix-'
-    )
-    assert encoded_path == 'testprefix-tests%2Ftestpath-testsuffix'
 
-    encoded_path = utils.encode_path('tästs/tøstpath')
-    assert encoded_path == 't%C3%A4sts%2Ft%C3%B8stpath'
+@pytest.mark.parametrize(('path', 'suffix', 'prefix', 'expected'), [
+    ('tests/testpath', '', '', 'tests%2Ftestpath'),
+    ('tests/testpath', '-testsuffix', 'testprefix-',
+     'testprefix-tests%2Ftestpath-testsuffix'),
+    ('tästs/tøstpath', '', '', 't%C3%A4sts%2Ft%C3%B8stpath')
+])
+def test_encode_path(path, suffix, prefix, expected):
+    """Tests for the encode_path function."""
+    assert utils.encode_path(path, suffix=suffix, prefix=prefix) == expected
 
 
-def test_decode_path():
+@pytest.mark.parametrize(('path', 'suffix', 'expected'), [
+    ('tests%2Ftestpath', '', 'tests/testpath'),
+    ('tests%2Ftestpath-testsuffix', '-testsuffix', 'tests/testpath'),
+    ('t%C3%A4sts%2Ft%C3%B8stpath', '', 't\u00e4sts/t\u00f8stpath')
+])
+def test_decode_path(path, suffix, expected):
     """Tests for the decode_path function."""
-
-    decoded_path = utils.decode_path('tests%2Ftestpath')
-    assert decoded_path == 'tests/testpath'
-
-    decoded_path = utils.decode_path(
-        'tests%2Ftestpath-testsuffix', suffix='-testsuffix'
-    )
-    assert decoded_path == 'tests/testpath'
-
-    decoded_path = utils.decode_path('t%C3%A4sts%2Ft%C3%B8stpath')
-    assert decoded_path == 't\u00e4sts/t\u00f8stpath'
+    assert utils.decode_path(path, suffix=suffix) == expected
 
 
 def test_create_amdfile(testpath):
@@ -47,29 +50,18 @@ def test_create_amdfile(testpath):
     md_creator = utils.MdCreator(testpath)
 
     sample_data = lxml.etree.Element('sampleData')
+    filename = utils.md_filename(utils.generate_digest(sample_data), 'NISOIMG')
     md_creator.write_md(sample_data, 'NISOIMG', '2.0')
 
-    element_tree = lxml.etree.parse(
-        os.path.join(
-            testpath,
-            '455752263d67f67402b0dc9e7119e5b3-NISOIMG-amd.xml'
-        )
-    )
+    element_tree = lxml.etree.parse(os.path.join(testpath, filename), PARSER)
 
     # The file should contain one techmd element
-    amd_elements = element_tree.xpath(
-        '/mets:mets/mets:amdSec/mets:techMD',
-        namespaces={"mets": "http://www.loc.gov/METS/"}
-    )
+    amd_elements = TECHMD_XPATH(element_tree)
     assert len(amd_elements) == 1
 
     # The techMD element should contain one sampleData element wrapped in
     # mdWrap and xmlData elements
-    sample_data_elements \
-        = amd_elements[0].xpath(
-            '//mets:mdWrap/mets:xmlData/sampleData',
-            namespaces={"mets": "http://www.loc.gov/METS/"}
-        )
+    sample_data_elements = SAMPLE_DATA_XPATH(amd_elements[0])
     assert len(sample_data_elements) == 1
 
 
@@ -86,26 +78,58 @@ def test_add_mdreference(testpath):
     md_creator.write_references()
 
     # Read created file. Reference should be found for both files
-    etree = lxml.etree.parse(os.path.join(testpath, 'md-references.xml'))
-    reference = etree.xpath(
-        '/mdReferences/mdReference[@file="path/to/file1"]'
-    )
-    assert reference[0].text == 'abcd1234'
-    reference = etree.xpath(
-        '/mdReferences/mdReference[@file="path/to/file2"]'
-    )
-    assert reference[0].text == 'abcd1234'
-
-
-def test_copy_etree():
+    root = lxml.etree.parse(os.path.join(testpath, 'md-references.xml'),
+                            PARSER).getroot()
+    references = {elem.get('file'): elem.text for elem in root}
+    assert references['path/to/file1'] == 'abcd1234'
+    assert references['path/to/file2'] == 'abcd1234'
+
+
+class HashWriter(object):
+    """File-like object, which feeds the written data to a hash."""
+
+    def __init__(self):
+        self.hash = hashlib.md5()
+
+    def write(self, data):
+        """Update the hash with given data.
+
+        :data: Bytes to write
+        """
+        self.hash.update(data)
+
+
+def c14n_digest(etree):
+    """Return digest of the canonical serialization of an element tree
+    without keeping the serialized document in memory.
+
+    :etree: XML element tree
+    :returns: MD5 digest
+    """
+    writer = HashWriter()
+    etree.write_c14n(writer)
+    return writer.hash.hexdigest()
+
+
+@pytest.fixture(scope='session')
+def sample_md_references():
+    """Parse the sample MD reference file once per test session.
+
+    :returns: Sample MD reference element tree
+    """
+    return lxml.etree.parse("tests/data/sample_md-references.xml", PARSER)
+
+
+def test_copy_etree(sample_md_references):
     """Test that copy_etree creates a new lxml.etree
     instance with identical data.
     """
-    etree1 = lxml.etree.parse("tests/data/sample_md-references.xml")
-    etree2 = utils.copy_etree(etree1)
+    etree = utils.copy_etree(sample_md_references)
+
+    assert id(sample_md_references) != id(etree)
 
-    assert id(etree1) != id(etree2)
-    assert lxml.etree.tostring(etree1) == lxml.etree.tostring(etree2)
+    assert len(list(sample_md_references.iter())) == len(list(etree.iter()))
+    assert c14n_digest(sample_md_references) == c14n_digest(etree)
 
 
 def test_hashing_same_attribute():